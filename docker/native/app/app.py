@@ -1,19 +1,21 @@
 """
 DataLake Native - Versão Baseada em Arquivos
 Flask App com Jobs Agendados e Dashboard
-Armazenamento: JSON files (S3-ready)
+Armazenamento: JSON Lines files, append-only (S3-ready)
 """
 
 import os
 import json
+import heapq
 import logging
+import threading
+from collections import Counter, OrderedDict
 from datetime import datetime, timedelta
 from flask import Flask, render_template, jsonify, request
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
-import pandas as pd
-import requests
 import uuid
+import random
 from pathlib import Path
 
 # Configuração de logging
@@ -23,6 +25,8 @@ logger = logging.getLogger(__name__)
 # Configuração de storage
 STORAGE_TYPE = os.getenv('STORAGE_TYPE', 'local')  # local ou s3
 DATA_DIR = Path(os.getenv('DATA_DIR', './data'))  # Usar ./data por padrão
+RECORDS_CACHE_SIZE = int(os.getenv('RECORDS_CACHE_SIZE', '128'))  # Arquivos em cache
+WEATHER_MAX_DAYS = int(os.getenv('WEATHER_MAX_DAYS', '30'))  # Janela máxima de leitura
 
 # Inicialização Flask
 app = Flask(__name__)
@@ -43,75 +47,123 @@ def ensure_data_structure():
     
     logger.info(f"📁 Estrutura de dados criada em {DATA_DIR}")
 
-def save_job_execution(execution_data):
-    """Salvar execução de job em arquivo JSON"""
-    today = datetime.now().strftime('%Y%m%d')
-    file_path = DATA_DIR / 'logs' / f'jobs_{today}.json'
+def append_record(file_path, record):
+    """Acrescentar um registro ao final de um arquivo JSON Lines"""
+    line = (json.dumps(record, default=str) + '\n').encode()
     
-    # Carregar execuções existentes
-    executions = []
-    if file_path.exists():
-        with open(file_path, 'r') as f:
-            executions = json.load(f)
+    # A linha inteira vai em um único write, sem reescrever o arquivo
+    with open(file_path, 'a+b') as f:
+        # Se uma escrita anterior foi interrompida antes do '\n', fechar a
+        # linha quebrada primeiro para o novo registro não ficar colado nela
+        if os.fstat(f.fileno()).st_size:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                line = b'\n' + line
+        
+        f.write(line)
+
+def parse_json_lines(f):
+    """Ler registros de um arquivo JSON Lines aberto"""
+    records = []
     
-    # Adicionar nova execução
-    executions.append(execution_data)
+    for line_number, line in enumerate(f, start=1):
+        # Uma linha sem '\n' final ainda está sendo escrita por append_record;
+        # ignorá-la evita ler registros truncados sem precisar de fsync/lock
+        if not line.endswith('\n') or not line.strip():
+            continue
+        
+        # Uma escrita interrompida deixa texto quebrado, que append_record
+        # isola em uma linha própria: pular só essa linha em vez de derrubar
+        # o arquivo todo
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError as e:
+            logger.warning(f"⚠️ Linha inválida ignorada em {f.name}:{line_number}: {e}")
     
-    # Salvar arquivo
-    with open(file_path, 'w') as f:
-        json.dump(executions, f, indent=2, default=str)
+    return records
 
-def save_weather_data(weather_data):
-    """Salvar dados meteorológicos em arquivo JSON"""
-    today = datetime.now().strftime('%Y%m%d')
-    file_path = DATA_DIR / 'raw' / 'weather' / f'weather_{today}.json'
+# Cache LRU de arquivos já lidos: path -> ((mtime_ns, tamanho), registros).
+# O limite (RECORDS_CACHE_SIZE) cobre os 30 dias lidos pelas APIs sem
+# crescer com o uptime.
+_records_cache = OrderedDict()
+_records_cache_lock = threading.Lock()
+
+def read_cached(file_path, parse):
+    """Ler um arquivo de registros, reaproveitando o parse se ele não mudou.
+    A lista devolvida fica no cache e é compartilhada: não modificá-la."""
+    try:
+        stat = file_path.stat()
+    except FileNotFoundError:
+        return []
     
-    # Carregar dados existentes
-    data = []
-    if file_path.exists():
-        with open(file_path, 'r') as f:
-            data = json.load(f)
+    version = (stat.st_mtime_ns, stat.st_size)
+    with _records_cache_lock:
+        cached = _records_cache.get(file_path)
+        if cached and cached[0] == version:
+            _records_cache.move_to_end(file_path)
+            return cached[1]
+    
+    with open(file_path, 'r') as f:
+        records = parse(f)
     
-    # Adicionar novos dados
-    data.append(weather_data)
+    with _records_cache_lock:
+        _records_cache[file_path] = (version, records)
+        _records_cache.move_to_end(file_path)
+        while len(_records_cache) > RECORDS_CACHE_SIZE:
+            _records_cache.popitem(last=False)
+    return records
+
+def load_records(file_path):
+    """Carregar registros de um arquivo JSON Lines (e do .json legado, se existir)"""
+    # Arquivos antigos guardavam uma lista JSON por dia
+    records = list(read_cached(file_path.with_suffix('.json'), json.load))
+    records.extend(read_cached(file_path, parse_json_lines))
+    return records
+
+def save_job_execution(execution_data):
+    """Salvar execução de job (append no arquivo do dia em que começou)"""
+    day = datetime.fromisoformat(execution_data['start_time']).strftime('%Y%m%d')
+    file_path = DATA_DIR / 'logs' / f'jobs_{day}.jsonl'
     
-    # Salvar arquivo
-    with open(file_path, 'w') as f:
-        json.dump(data, f, indent=2, default=str)
+    append_record(file_path, execution_data)
+
+def save_weather_data(weather_data):
+    """Salvar dados meteorológicos (append no arquivo do dia da leitura)"""
+    day = datetime.fromisoformat(weather_data['timestamp']).strftime('%Y%m%d')
+    file_path = DATA_DIR / 'raw' / 'weather' / f'weather_{day}.jsonl'
+    
+    append_record(file_path, weather_data)
 
 def load_job_executions(days=7):
-    """Carregar execuções dos últimos N dias"""
+    """Carregar execuções dos últimos N dias (sem ordem definida)"""
     executions = []
+    now = datetime.now()
     
     for i in range(days):
-        date = (datetime.now() - timedelta(days=i)).strftime('%Y%m%d')
-        file_path = DATA_DIR / 'logs' / f'jobs_{date}.json'
-        
-        if file_path.exists():
-            with open(file_path, 'r') as f:
-                daily_executions = json.load(f)
-                executions.extend(daily_executions)
+        date = (now - timedelta(days=i)).strftime('%Y%m%d')
+        file_path = DATA_DIR / 'logs' / f'jobs_{date}.jsonl'
+        executions.extend(load_records(file_path))
     
-    # Ordenar por timestamp (mais recente primeiro)
-    executions.sort(key=lambda x: x['start_time'], reverse=True)
+    # Quem precisa de ordem escolhe só o necessário (max / heapq.nlargest)
     return executions
 
 def load_weather_data(hours=24):
     """Carregar dados meteorológicos das últimas N horas"""
     data = []
+    now = datetime.now()
+    cutoff = now - timedelta(hours=hours)
     
-    # Verificar últimos 2 dias para cobrir 24h
-    for i in range(2):
-        date = (datetime.now() - timedelta(days=i)).strftime('%Y%m%d')
-        file_path = DATA_DIR / 'raw' / 'weather' / f'weather_{date}.json'
-        
-        if file_path.exists():
-            with open(file_path, 'r') as f:
-                daily_data = json.load(f)
-                data.extend(daily_data)
+    # Ler apenas os arquivos diários que cobrem a janela pedida, do mais
+    # antigo para o mais recente: como os arquivos são append-only, os
+    # registros já chegam em ordem e a ordenação final é linear
+    # (limitado a WEATHER_MAX_DAYS, já que `hours` vem da query string)
+    days = min((now.date() - cutoff.date()).days + 1, WEATHER_MAX_DAYS)
+    for i in reversed(range(days)):
+        date = (now - timedelta(days=i)).strftime('%Y%m%d')
+        file_path = DATA_DIR / 'raw' / 'weather' / f'weather_{date}.jsonl'
+        data.extend(load_records(file_path))
     
     # Filtrar últimas N horas
-    cutoff = datetime.now() - timedelta(hours=hours)
     filtered_data = []
     
     for record in data:
@@ -124,17 +176,21 @@ def load_weather_data(hours=24):
     return filtered_data
 
 # Jobs
+# Condições climáticas possíveis para a simulação
+WEATHER_CONDITIONS = ('Ensolarado', 'Nublado', 'Parcialmente nublado', 'Chuvoso', 'Garoa')
+
 def collect_weather_data():
     """Job para coletar dados de temperatura de Campinas"""
     job_id = str(uuid.uuid4())
     job_name = "weather_collection"
     start_time = datetime.now()
+    started_at = start_time.isoformat()  # Um único timestamp por execução
     
     execution_data = {
         'id': job_id,
         'job_name': job_name,
         'status': 'running',
-        'start_time': start_time.isoformat(),
+        'start_time': started_at,
         'end_time': None,
         'duration_seconds': None,
         'records_processed': 0,
@@ -145,15 +201,12 @@ def collect_weather_data():
         logger.info(f"🌡️ Iniciando coleta de dados meteorológicos...")
         
         # Simular dados realísticos para Campinas
-        import random
-        
         temperature = round(random.uniform(18, 32), 1)  # Temperatura típica de Campinas
         humidity = round(random.uniform(40, 85), 1)
         pressure = round(random.uniform(1010, 1025), 1)
         
-        # Condições climáticas aleatórias
-        conditions = ['Ensolarado', 'Nublado', 'Parcialmente nublado', 'Chuvoso', 'Garoa']
-        description = random.choice(conditions)
+        # Condição climática aleatória
+        description = random.choice(WEATHER_CONDITIONS)
         
         weather_data = {
             'id': str(uuid.uuid4()),
@@ -162,7 +215,7 @@ def collect_weather_data():
             'humidity': humidity,
             'pressure': pressure,
             'description': description,
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': started_at,
             'job_execution_id': job_id
         }
         
@@ -214,20 +267,22 @@ def get_metrics():
         # Carregar execuções
         executions = load_job_executions(days=30)
         
-        # Calcular métricas
-        total_jobs = len(executions)
-        successful_jobs = len([e for e in executions if e['status'] == 'success'])
-        failed_jobs = len([e for e in executions if e['status'] == 'error'])
-        
-        # Jobs hoje
+        # Calcular métricas (uma única passada pelas execuções)
         today = datetime.now().date()
-        jobs_today = len([
-            e for e in executions 
-            if datetime.fromisoformat(e['start_time']).date() == today
-        ])
+        status_counts = Counter()
+        jobs_today = 0
+        
+        for e in executions:
+            status_counts[e['status']] += 1
+            if datetime.fromisoformat(e['start_time']).date() == today:
+                jobs_today += 1
+        
+        total_jobs = len(executions)
+        successful_jobs = status_counts['success']
+        failed_jobs = status_counts['error']
         
         # Última execução
-        last_execution = executions[0] if executions else None
+        last_execution = max(executions, key=lambda x: x['start_time'], default=None)
         
         # Taxa de sucesso
         success_rate = (successful_jobs / total_jobs * 100) if total_jobs > 0 else 0
@@ -265,13 +320,15 @@ def get_job_executions():
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
         
-        # Carregar todas as execuções
+        # Carregar todas as execuções (sem ordenar o histórico inteiro)
         all_executions = load_job_executions(days=30)
         
-        # Paginação manual
+        # Paginação manual: só as end_idx mais recentes precisam ser ordenadas
         start_idx = (page - 1) * per_page
         end_idx = start_idx + per_page
-        executions = all_executions[start_idx:end_idx]
+        executions = heapq.nlargest(
+            max(end_idx, 0), all_executions, key=lambda x: x['start_time']
+        )[start_idx:]
         
         total = len(all_executions)
         pages = (total + per_page - 1) // per_page
@@ -129,7 +129,6 @@ WorkingDirectory=/home/prefect
 Environment=PATH=/home/prefect/prefect-env/bin
 Environment=PREFECT_API_URL=http://localhost:4200/api
 ExecStartPre=/bin/sleep 30
-ExecStartPre=/home/prefect/prefect-env/bin/prefect work-pool create --type process default-pool
 ExecStart=/home/prefect/prefect-env/bin/prefect worker start --pool default-pool
 Restart=always
 RestartSec=10
@@ -155,6 +154,15 @@ systemctl start prefect-server
 log "⏳ Waiting for Prefect server to start..."
 sleep 30
 
+# Create work pool once (the worker service only runs the worker)
+log "🏊 Creating Prefect work pool..."
+sudo -u prefect bash -c "
+cd /home/prefect
+source prefect-env/bin/activate
+export PREFECT_API_URL=http://localhost:4200/api
+prefect work-pool create --type process default-pool
+" || log "⚠️ Could not create work pool (it may already exist)"
+
 # Start worker
 systemctl start prefect-worker
 